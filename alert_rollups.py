@@ -0,0 +1,224 @@
+# alert_rollups.py
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import pandas as pd
+
+ROLLUP_DB = "alert_rollups.db"  # Materialized alert counts, kept apart from employee.db
+SECURITY_ALERT_LOG = "security_alerts.csv"
+
+UNKNOWN_ROLE = "Unknown"
+
+# Bucket formats derived from "%Y-%m-%d %H:%M:%S" alert timestamps.
+GRANULARITIES = {
+    'hour': 13,  # "YYYY-MM-DD HH"
+    'day': 10,   # "YYYY-MM-DD"
+}
+
+_conn = None
+_lock = threading.RLock()
+
+
+def get_connection():
+    """
+    Return the shared connection to the rollup database, creating it (and the
+    rollup tables) on first use. A newly created rollup table is seeded from the
+    alerts already in SECURITY_ALERT_LOG, so callers that also append to that log
+    must open the connection before writing their row. The connection stays open for
+    the process lifetime.
+    """
+    global _conn
+    with _lock:
+        if _conn is None:
+            _conn = _open_connection()
+    return _conn
+
+
+def _open_connection():
+    try:
+        conn = sqlite3.connect(ROLLUP_DB, check_same_thread=False)
+        created = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'alert_rollups'"
+        ).fetchone() is None
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS alert_rollups (
+                    granularity TEXT NOT NULL,
+                    dimension TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (granularity, dimension, bucket, key)
+                )
+            ''')
+            # How much of the event log has had its ML threats rolled up.
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rollup_state (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            ''')
+            if created:
+                _apply(conn, _increments(_read_alert_log(SECURITY_ALERT_LOG)))
+        return conn
+    except sqlite3.Error as e:
+        print(f"Rollup database connection error: {e}")
+        return None
+
+
+def _read_alert_log(path):
+    """Yield (device, role, threat_time) for each alert logged in `path`."""
+    try:
+        df = pd.read_csv(path, on_bad_lines='skip')
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        print(f"Error reading alert log {path}: {e}")
+        return []
+    if df.shape[1] < 3:
+        return []
+    # Older alert logs use different column names, but device and time are always
+    # the first and third columns. The alert log does not record the employee role.
+    return ((device, UNKNOWN_ROLE, threat_time)
+            for device, threat_time in zip(df.iloc[:, 0], df.iloc[:, 2]))
+
+
+def _increments(alerts):
+    increments = Counter()
+    for device, role, threat_time in alerts:
+        threat_time = str(threat_time)
+        for granularity, width in GRANULARITIES.items():
+            bucket = threat_time[:width]
+            increments[(granularity, 'device', bucket, str(device))] += 1
+            increments[(granularity, 'role', bucket, str(role or UNKNOWN_ROLE))] += 1
+    return increments
+
+
+def _apply(conn, increments, watermark=None):
+    conn.executemany('''
+        INSERT INTO alert_rollups (granularity, dimension, bucket, key, count)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (granularity, dimension, bucket, key)
+        DO UPDATE SET count = count + excluded.count
+    ''', [key + (count,) for key, count in increments.items()])
+    if watermark is not None:
+        rows, offset = watermark
+        conn.executemany(
+            "INSERT OR REPLACE INTO rollup_state (name, value) VALUES (?, ?)",
+            [('event_log_rows', rows), ('event_log_offset', offset)])
+
+
+def record_alerts(alerts, watermark=None):
+    """
+    Add alerts to the rollups. `alerts` is an iterable of (device, role, threat_time)
+    tuples; counts per device and per role are incremented for each hour and day bucket
+    in a single transaction. If given, `watermark` (rows, byte offset) is stored as the
+    event log position up to which threats have been rolled up, in the same transaction.
+    """
+    increments = _increments(alerts)
+    if not increments and watermark is None:
+        return
+
+    with _lock:
+        conn = get_connection()
+        if not conn:
+            return
+        try:
+            with conn:
+                _apply(conn, increments, watermark)
+        except sqlite3.Error as e:
+            print(f"Rollup update error: {e}")
+
+
+def get_event_watermark():
+    """
+    Return (rows, byte offset) of the event log whose ML threats are already in the
+    rollups; (0, 0) if none have been recorded yet.
+    """
+    state = dict(_query("SELECT name, value FROM rollup_state", ()))
+    return state.get('event_log_rows', 0), state.get('event_log_offset', 0)
+
+
+def rebuild_from_log(path=None):
+    """
+    Replace the rollup counts with those of the alerts logged in `path` (default
+    SECURITY_ALERT_LOG). This runs automatically when the rollup table is first
+    created. ML threats are not written to the alert log, so the event log watermark
+    is reset and the next analyze_threats() call rolls them up again.
+    """
+    with _lock:
+        conn = get_connection()
+        if not conn:
+            return
+        try:
+            with conn:
+                conn.execute("DELETE FROM alert_rollups")
+                conn.execute("DELETE FROM rollup_state")
+                _apply(conn, _increments(_read_alert_log(path or SECURITY_ALERT_LOG)))
+        except sqlite3.Error as e:
+            print(f"Rollup rebuild error: {e}")
+
+
+def record_alert(device, role, threat_time):
+    """Add a single alert to the rollups."""
+    record_alerts([(device, role, threat_time)])
+
+
+def _bucket_range(granularity, periods, now):
+    """Return the first and last bucket labels covering the latest `periods` buckets."""
+    step = 3600 if granularity == 'hour' else 86400
+    width = GRANULARITIES[granularity]
+    first = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now - (periods - 1) * step))[:width]
+    last = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))[:width]
+    return first, last
+
+
+def _query(sql, params):
+    with _lock:
+        conn = get_connection()
+        if not conn:
+            return []
+        try:
+            return conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"Rollup query error: {e}")
+            return []
+
+
+def top_keys(dimension='device', granularity='day', periods=7, limit=10, now=None):
+    """
+    Return [(key, count), ...] for the keys of `dimension` ('device' or 'role') with the
+    most alerts over the latest `periods` hour/day buckets, e.g. top devices this week.
+    Only the buckets in the window are read, so the cost does not grow with history.
+    """
+    first, last = _bucket_range(granularity, periods, now or time.time())
+    return _query('''
+        SELECT key, SUM(count) AS total FROM alert_rollups
+        WHERE granularity = ? AND dimension = ? AND bucket BETWEEN ? AND ?
+        GROUP BY key ORDER BY total DESC, key LIMIT ?
+    ''', (granularity, dimension, first, last, limit))
+
+
+def counts_by_bucket(dimension='role', granularity='hour', periods=24, now=None):
+    """
+    Return [(bucket, key, count), ...] for every key of `dimension` over the latest
+    `periods` buckets, e.g. alerts per hour per role for the last day.
+    """
+    first, last = _bucket_range(granularity, periods, now or time.time())
+    return _query('''
+        SELECT bucket, key, count FROM alert_rollups
+        WHERE granularity = ? AND dimension = ? AND bucket BETWEEN ? AND ?
+        ORDER BY bucket, key
+    ''', (granularity, dimension, first, last))
+
+
+def top_devices_this_week(limit=10):
+    """Return the devices with the most alerts over the last 7 days."""
+    return top_keys('device', 'day', 7, limit)
+
+
+def alerts_per_hour_by_role(hours=24):
+    """Return alert counts per hour per employee role over the last `hours` hours."""
+    return counts_by_bucket('role', 'hour', hours)
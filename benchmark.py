@@ -0,0 +1,219 @@
+# benchmark.py
+"""
+Scaling benchmark for model training and threat scoring on synthetic USB event logs.
+
+Example:
+    python benchmark.py --rows 10000 100000 1000000 --n-estimators 50 100 --n-jobs 1 -1
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from feature_store import FeatureStore, combine_features
+from train_model import train_model
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+VENDORS = ["SanDisk_Cruzer_Blade", "Kingston_DataTraveler_3.0", "Samsung_Flash_Drive_FIT",
+           "WD_My_Passport_0748", "Seagate_Expansion_Desk", "Generic_Mass_Storage",
+           "Lexar_JumpDrive", "Toshiba_TransMemory", "Logitech_USB_Receiver", "Apple_iPhone"]
+DRIVE_LETTERS = ["D:", "E:", "F:", "G:", "H:"]
+
+# Relative likelihood of an insertion at each hour of the day (office-hours heavy).
+HOUR_WEIGHTS = np.array([1, 1, 1, 1, 1, 2, 4, 8, 20, 30, 30, 28,
+                         20, 28, 30, 28, 22, 12, 6, 4, 3, 2, 2, 1], dtype=float)
+
+def generate_devices(n_devices, rng):
+    """Return device identifiers: mostly vendor serials, plus some bare drive letters."""
+    vendors = rng.choice(VENDORS, size=n_devices)
+    serials = rng.integers(0, 16 ** 8, size=n_devices)
+    devices = [f"{v}_{s:08X}" for v, s in zip(vendors, serials)]
+    devices[:len(DRIVE_LETTERS)] = DRIVE_LETTERS
+    return np.array(devices)
+
+
+def generate_event_log(n_rows, path, seed=42, days=90):
+    """
+    Write a synthetic event log of about `n_rows` rows to `path`, in the same format
+    as event_data.csv. Device popularity follows a Zipf-like distribution, insertions
+    cluster in office hours, dwell times are log-normal and a few removals are missed.
+    Returns the number of rows written.
+    """
+    rng = np.random.default_rng(seed)
+    n_devices = max(len(DRIVE_LETTERS), n_rows // 200)
+    devices = generate_devices(n_devices, rng)
+    popularity = 1.0 / np.arange(1, n_devices + 1) ** 1.1
+    popularity /= popularity.sum()
+    hour_weights = HOUR_WEIGHTS / HOUR_WEIGHTS.sum()
+
+    # Epoch seconds are formatted back as UTC below, so the hour weights map to logged hours.
+    start = pd.Timestamp("2025-01-01").timestamp()
+    sessions_per_day = rng.multinomial(n_rows // 2, np.full(days, 1 / days))
+
+    # Events are generated and written one day at a time, with devices kept as integer
+    # indices until a chunk is formatted, so memory does not grow with n_rows.
+    # Removals that fall after midnight are carried over into the next day's chunk.
+    carry_times = np.empty(0)
+    carry_devices = np.empty(0, dtype=np.int64)
+    carry_inserted = np.empty(0, dtype=bool)
+    written = 0
+    for day, n_sessions in enumerate(sessions_per_day):
+        hour = rng.choice(24, size=n_sessions, p=hour_weights)
+        insert_times = start + day * 86400 + hour * 3600 + rng.integers(0, 3600, size=n_sessions)
+        dwell = rng.lognormal(mean=np.log(600), sigma=1.2, size=n_sessions).astype(int) + 1
+        session_devices = rng.choice(n_devices, size=n_sessions, p=popularity)
+        removed = rng.random(n_sessions) > 0.03
+
+        times = np.concatenate([carry_times, insert_times, insert_times[removed] + dwell[removed]])
+        device_idx = np.concatenate([carry_devices, session_devices, session_devices[removed]])
+        inserted = np.concatenate([carry_inserted, np.ones(n_sessions, dtype=bool),
+                                   np.zeros(int(removed.sum()), dtype=bool)])
+        order = np.argsort(times, kind="stable")
+        times, device_idx, inserted = times[order], device_idx[order], inserted[order]
+
+        # Everything before the next day starts is final.
+        cutoff = start + (day + 1) * 86400 if day < days - 1 else np.inf
+        ready = int(np.searchsorted(times, cutoff))
+        if ready:
+            chunk = pd.DataFrame({
+                "device": devices[device_idx[:ready]],
+                "event_type": np.where(inserted[:ready], "inserted", "removed"),
+                "timestamp": pd.to_datetime(times[:ready], unit="s").strftime("%Y-%m-%d %H:%M:%S"),
+                "extra_info": "Synthetic event",
+            })
+            chunk.to_csv(path, mode="a" if written else "w", header=not written, index=False)
+            written += ready
+        carry_times, carry_devices, carry_inserted = times[ready:], device_idx[ready:], inserted[ready:]
+    return written
+
+
+def peak_rss_mb():
+    """Peak resident set size of the current process in MB (None if unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def score_events(event_log, model_file):
+    """
+    Score every event the way analyze_threats does for the full log, with the same
+    point-in-time features used in training, and return the number of threats.
+    """
+    with open(model_file, 'rb') as f:
+        vectorizer, model = pickle.load(f)
+    df = pd.read_csv(event_log, on_bad_lines='skip')
+    devices = df['device'].astype(str)
+    X = combine_features(vectorizer, model, devices, FeatureStore().replay(df))
+    return int((model.predict(X) == 1).sum())
+
+
+def _rounded(value, digits):
+    return None if value is None else round(value, digits)
+
+
+def run_training(event_log, model_file, params):
+    """Train one configuration; returns (accuracy, wall time, peak RSS of this process)."""
+    start = time.perf_counter()
+    accuracy = train_model(event_log, model_file, **params)
+    return accuracy, time.perf_counter() - start, peak_rss_mb()
+
+
+def run_scoring(event_log, model_file):
+    """Score the log with a trained model; returns (wall time, peak RSS of this process)."""
+    start = time.perf_counter()
+    score_events(event_log, model_file)
+    return time.perf_counter() - start, peak_rss_mb()
+
+
+def _in_fresh_process(func, *args):
+    # A new single-use worker per step keeps each peak RSS measurement independent.
+    # Spawned rather than forked: a forked child's peak RSS starts at the parent's.
+    with multiprocessing.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(func, args)
+
+
+def run_config(event_log, n_rows, params, seed):
+    """Benchmark training and scoring of one configuration, each in its own process."""
+    model_file = os.path.join(os.path.dirname(event_log), "model.pkl")
+    accuracy, train_time, train_rss = _in_fresh_process(
+        run_training, event_log, model_file, dict(params, random_state=seed))
+    score_time, score_rss = _in_fresh_process(run_scoring, event_log, model_file)
+
+    result = dict(rows=n_rows, **params)
+    result.update({
+        "train_s": round(train_time, 3),
+        "train_rows_per_s": round(n_rows / train_time),
+        "score_s": round(score_time, 3),
+        "score_rows_per_s": round(n_rows / score_time),
+        "train_peak_rss_mb": _rounded(train_rss, 1),
+        "score_peak_rss_mb": _rounded(score_rss, 1),
+        "model_mb": round(os.path.getsize(model_file) / (1024 * 1024), 3),
+        "accuracy": _rounded(accuracy, 4),
+    })
+    os.remove(model_file)
+    return result
+
+
+def _none_or_int(value):
+    return None if value.lower() == "none" else int(value)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark threat model training and scoring.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="Synthetic event log sizes (up to 10M rows).")
+    parser.add_argument("--n-estimators", type=int, nargs="+", default=[100])
+    parser.add_argument("--max-depth", type=_none_or_int, nargs="+", default=[None])
+    parser.add_argument("--n-jobs", type=_none_or_int, nargs="+", default=[None])
+    parser.add_argument("--vocab-size", type=_none_or_int, nargs="+", default=[None],
+                        help="Cap on the CountVectorizer vocabulary (not the forest's max_features).")
+    parser.add_argument("--seed", type=int, default=42,
+                        help="Seeds the synthetic data, the train/test split and the forest.")
+    parser.add_argument("--output", help="Also write the results to this CSV file.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # Peak RSS of a worker that only imports this module; the RSS columns include it.
+    idle_rss = _rounded(_in_fresh_process(peak_rss_mb), 1)
+    print(f"Idle worker peak RSS: {idle_rss} MB")
+    grid = [dict(n_estimators=e, max_depth=d, n_jobs=j, vocab_size=v)
+            for e, d, j, v in itertools.product(args.n_estimators, args.max_depth,
+                                                args.n_jobs, args.vocab_size)]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_rows in args.rows:
+            event_log = os.path.join(tmp_dir, f"events_{n_rows}.csv")
+            print(f"Generating synthetic event log with {n_rows} rows...")
+            actual_rows = generate_event_log(n_rows, event_log, seed=args.seed)
+            for params in grid:
+                print(f"Benchmarking {actual_rows} rows with {params}...")
+                result = run_config(event_log, actual_rows, params, args.seed)
+                result["idle_worker_rss_mb"] = idle_rss
+                results.append(result)
+            os.remove(event_log)
+
+    df = pd.DataFrame(results)
+    print("\nBenchmark results:")
+    print(df.to_string(index=False))
+    if args.output:
+        df.to_csv(args.output, index=False)
+        print("Results written to", args.output)
+
+
+if __name__ == "__main__":
+    main()
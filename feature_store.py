@@ -0,0 +1,174 @@
+# feature_store.py
+import math
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, hstack
+
+FEATURE_STORE_FILE = "feature_store.pkl"
+
+# Half-life (in seconds) of the exponentially decayed insert/event rates.
+RATE_HALF_LIFE = 3600.0
+_DECAY = math.log(2) / RATE_HALF_LIFE
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+FEATURE_NAMES = (
+    ["insert_rate", "event_rate", "seconds_since_last_seen",
+     "dwell_count", "dwell_mean", "dwell_std"]
+    + [f"hour_{h:02d}" for h in range(24)]
+)
+
+# Features of a device with no prior events.
+_NO_HISTORY = [0.0] * len(FEATURE_NAMES)
+
+
+class DeviceStats:
+    """Running aggregates for a single device, updated in O(1) per event."""
+    __slots__ = ("last_seen", "insert_time", "insert_rate", "event_rate",
+                 "dwell_count", "dwell_mean", "dwell_m2", "hours")
+
+    def __init__(self):
+        self.last_seen = None
+        self.insert_time = None  # Time of the insertion still waiting for its removal.
+        self.insert_rate = 0.0
+        self.event_rate = 0.0
+        self.dwell_count = 0
+        self.dwell_mean = 0.0
+        self.dwell_m2 = 0.0
+        self.hours = [0] * 24
+
+    def update(self, event_type, event_time, hour):
+        decay = 1.0
+        if self.last_seen is not None:
+            decay = math.exp(-_DECAY * max(event_time - self.last_seen, 0.0))
+        self.event_rate = self.event_rate * decay + 1.0
+        self.insert_rate *= decay
+        self.last_seen = event_time
+
+        if event_type == "inserted":
+            self.insert_rate += 1.0
+            self.insert_time = event_time
+            self.hours[hour] += 1
+        elif event_type == "removed" and self.insert_time is not None:
+            # Welford's update of the dwell-time mean and variance.
+            dwell = event_time - self.insert_time
+            self.insert_time = None
+            self.dwell_count += 1
+            delta = dwell - self.dwell_mean
+            self.dwell_mean += delta / self.dwell_count
+            self.dwell_m2 += delta * (dwell - self.dwell_mean)
+
+    def features(self, now):
+        """Return this device's feature vector as of time `now`."""
+        since = max(now - self.last_seen, 0.0)
+        decay = math.exp(-_DECAY * since)
+        dwell_std = math.sqrt(self.dwell_m2 / self.dwell_count) if self.dwell_count else 0.0
+        total = sum(self.hours)
+        hours = [h / total for h in self.hours] if total else self.hours
+        return [self.insert_rate * decay, self.event_rate * decay, since,
+                self.dwell_count, self.dwell_mean, dwell_std] + hours
+
+
+def local_epoch_seconds(parsed):
+    """
+    Convert a Series of naive local datetimes (as written to the event log) to epoch
+    seconds. The UTC offset is looked up once per distinct hour, so DST changes are
+    honoured without calling time.mktime for every row.
+    """
+    naive = (parsed - pd.Timestamp(0)).dt.total_seconds()
+    hours = parsed.dt.floor('h')
+    offsets = {hour: (hour - pd.Timestamp(0)).total_seconds() - time.mktime(hour.timetuple())
+               for hour in hours.dropna().unique()}
+    return (naive - hours.map(offsets)).to_numpy()
+
+
+class FeatureStore:
+    """
+    Per-device behavioral aggregates (decayed rates, last-seen time, dwell-time
+    statistics and hour-of-day histogram) maintained incrementally from USB events.
+    Feature vectors are served in batch by replay() for training and full-log scoring,
+    and per event by update() for live events.
+    """
+
+    def __init__(self):
+        self.devices = {}
+        self._lock = threading.Lock()
+
+    def update(self, device, event_type, event_time=None, hour=None):
+        """
+        Fold a single USB event into the device's aggregates. Returns the device's
+        point-in-time feature vector from before this event (zeros for a new device),
+        so the event's own type never leaks into its features.
+        """
+        if event_time is None:
+            event_time = time.time()
+        if hour is None:
+            hour = time.localtime(event_time).tm_hour
+        with self._lock:
+            stats = self.devices.get(device)
+            if stats is None:
+                features = _NO_HISTORY
+                stats = self.devices[device] = DeviceStats()
+            else:
+                features = stats.features(event_time)
+            stats.update(event_type, event_time, hour)
+        return features
+
+    def replay(self, df):
+        """
+        Feed every event of an event log DataFrame (in order) through the store and
+        return each row's point-in-time feature vector (the device state before that
+        event), matching what log_usb_event records for live events.
+        """
+        rows = np.zeros((len(df), len(FEATURE_NAMES)))
+        if not {'device', 'event_type', 'timestamp'}.issubset(df.columns):
+            print("Warning: event log lacks device/event_type/timestamp columns; behavioral features are zero.")
+            return rows
+        # Parse all timestamps up front, as epoch seconds like the live path's time.time().
+        parsed = pd.to_datetime(df['timestamp'], format=TIMESTAMP_FORMAT, errors='coerce')
+        valid = parsed.notna().to_numpy()
+        event_times = local_epoch_seconds(parsed)
+        hours = parsed.dt.hour.fillna(0).astype(int).to_numpy()
+        for i, (device, event_type) in enumerate(zip(df['device'].astype(str), df['event_type'])):
+            if valid[i]:
+                rows[i] = self.update(device, event_type, event_times[i], hours[i])
+        return rows
+
+    def save(self, path=FEATURE_STORE_FILE):
+        """Persist the store atomically so a crash never leaves a truncated file."""
+        with self._lock:
+            data = pickle.dumps(self.devices, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=FEATURE_STORE_FILE):
+        """Load a persisted store, or return an empty one if none exists yet."""
+        store = cls()
+        try:
+            with open(path, 'rb') as f:
+                store.devices = pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            print(f"Error loading feature store {path}: {e}. Starting with an empty store.")
+        return store
+
+
+def combine_features(vectorizer, model, device_strings, behavior):
+    """
+    Build the model input: bag-of-words of the device string, followed by the
+    behavioral features when the model was trained with them.
+    """
+    X = vectorizer.transform(device_strings)
+    if getattr(model, 'n_features_in_', X.shape[1]) == X.shape[1]:
+        # Model trained before behavioral features were added.
+        return X
+    return hstack([X, csr_matrix(behavior)]).tocsr()
@@ -1,9 +1,19 @@
 # main.py
+import argparse
 from auth import login_prompt
 import threat_detection
+import threat_events
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Insider threat detection for USB activity.")
+    threat_detection.add_service_arguments(parser)
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
+
     # Step 1: Authenticate the employee.
     print("=== Employee Authentication ===")
     employee = None
@@ -15,6 +25,13 @@ def main():
     for key, value in employee.items():
         if key.lower() != "password":
             print(f"{key}: {value}")
+    threat_detection.set_active_employee(employee)
+
+    if args.service:
+        # Service mode: monitor continuously until SIGINT/SIGTERM.
+        print("\nStarting USB threat detection service...")
+        threat_detection.run_service(args.config)
+        return
 
     # Step 2: Start USB threat detection monitoring.
     print("\nStarting USB threat detection monitoring...")
@@ -33,6 +50,10 @@ def main():
     else:
         print("No threat events detected.")
 
+    # Step 4: Summarize alerts from the incrementally maintained rollups.
+    print()
+    threat_events.display_alert_summary()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,87 @@
+# test_alert_rollups.py
+import time
+
+import pytest
+
+import alert_rollups
+
+
+@pytest.fixture
+def rollups(tmp_path, monkeypatch):
+    """Point the module at a fresh rollup database and alert log under tmp_path."""
+    monkeypatch.setattr(alert_rollups, "ROLLUP_DB", str(tmp_path / "rollups.db"))
+    monkeypatch.setattr(alert_rollups, "SECURITY_ALERT_LOG", str(tmp_path / "alerts.csv"))
+    monkeypatch.setattr(alert_rollups, "_conn", None)
+    yield alert_rollups
+    if alert_rollups._conn is not None:
+        alert_rollups._conn.close()
+
+
+NOW = time.mktime((2025, 3, 10, 14, 30, 0, 0, 0, -1))
+
+
+def test_bucket_range_covers_latest_periods():
+    assert alert_rollups._bucket_range('day', 7, NOW) == ("2025-03-04", "2025-03-10")
+    assert alert_rollups._bucket_range('hour', 3, NOW) == ("2025-03-10 12", "2025-03-10 14")
+
+
+def test_record_alerts_and_top_keys(rollups):
+    rollups.record_alerts([
+        ("D:", "Manager", "2025-03-10 14:01:00"),
+        ("D:", "Analyst", "2025-03-09 09:00:00"),
+        ("E:", None, "2025-03-10 13:00:00"),
+        ("F:", "Manager", "2025-02-01 10:00:00"),  # Outside the 7-day window.
+    ])
+    rollups.record_alert("E:", "Manager", "2025-03-10 14:59:59")
+    rollups.record_alert("E:", "Manager", "2025-03-10 14:59:59")
+
+    assert rollups.top_keys('device', 'day', 7, now=NOW) == [("E:", 3), ("D:", 2)]
+    assert rollups.top_keys('device', 'day', 7, limit=1, now=NOW) == [("E:", 3)]
+    assert rollups.top_keys('role', 'day', 7, now=NOW) == [
+        ("Manager", 3), ("Analyst", 1), (alert_rollups.UNKNOWN_ROLE, 1)]
+    assert rollups.counts_by_bucket('role', 'hour', 2, now=NOW) == [
+        ("2025-03-10 13", alert_rollups.UNKNOWN_ROLE, 1),
+        ("2025-03-10 14", "Manager", 3),
+    ]
+
+
+def test_watermark_is_stored_with_alerts(rollups):
+    assert rollups.get_event_watermark() == (0, 0)
+    rollups.record_alerts([], watermark=(10, 512))
+    assert rollups.get_event_watermark() == (10, 512)
+    rollups.record_alerts([("D:", "Manager", "2025-03-10 14:00:00")], watermark=(12, 600))
+    assert rollups.get_event_watermark() == (12, 600)
+
+
+def test_new_database_is_seeded_from_alert_log(rollups, tmp_path):
+    (tmp_path / "alerts.csv").write_text(
+        "device,event_count,timestamp,alert_message\n"
+        "D:,2,2025-03-10 10:00:00,FLAG: Device [D:] has been inserted 2 times.\n"
+        "D:,4,2025-03-10 11:00:00,FLAG: Device [D:] has been inserted 4 times.\n"
+        "E:,2,2025-03-09 11:00:00,FLAG: Device [E:] has been inserted 2 times.\n"
+    )
+    assert rollups.top_keys('device', 'day', 7, now=NOW) == [("D:", 2), ("E:", 1)]
+
+    rollups.record_alert("E:", "Manager", "2025-03-10 12:00:00")
+    rollups.rebuild_from_log()
+    assert rollups.top_keys('device', 'day', 7, now=NOW) == [("D:", 2), ("E:", 1)]
+
+
+def test_first_flag_on_fresh_database_is_counted_once(rollups, tmp_path, monkeypatch):
+    import threat_detection
+
+    alert_log = tmp_path / "alerts.csv"
+    alert_log.write_text(
+        "device,insert_count,threat_time,flag_message\n"
+        "E:,2,2025-03-10 10:00:00,FLAG: Device [E:] inserted 2 times.\n"
+    )
+    monkeypatch.setattr(threat_detection, "SECURITY_ALERT_LOG", str(alert_log))
+    monkeypatch.setattr(threat_detection, "active_employee", {"role": "Manager"})
+
+    threat_detection.flag_insert_event("D:", 2)
+
+    now = time.time()
+    assert dict(rollups.top_keys('device', 'day', 7, now=now)) == {"D:": 1}
+    assert dict(rollups.top_keys('role', 'day', 7, now=now)) == {"Manager": 1}
+    # The alert that was already logged is seeded exactly once.
+    assert dict(rollups.top_keys('device', 'day', 100000, now=now)) == {"D:": 1, "E:": 1}
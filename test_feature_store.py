@@ -0,0 +1,94 @@
+# test_feature_store.py
+import math
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_store import (FEATURE_NAMES, RATE_HALF_LIFE, TIMESTAMP_FORMAT, DeviceStats,
+                           FeatureStore, local_epoch_seconds)
+
+
+def test_rates_halve_after_one_half_life():
+    stats = DeviceStats()
+    stats.update("inserted", 0.0, 10)
+    features = stats.features(RATE_HALF_LIFE)
+    assert features[0] == pytest.approx(0.5)  # insert_rate
+    assert features[1] == pytest.approx(0.5)  # event_rate
+    assert features[2] == pytest.approx(RATE_HALF_LIFE)  # seconds_since_last_seen
+
+
+def test_dwell_mean_and_std_match_welford():
+    stats = DeviceStats()
+    dwells = [60.0, 120.0, 300.0]
+    t = 0.0
+    for dwell in dwells:
+        stats.update("inserted", t, 9)
+        stats.update("removed", t + dwell, 9)
+        t += 1000.0
+    features = stats.features(t)
+    assert features[3] == len(dwells)
+    assert features[4] == pytest.approx(np.mean(dwells))
+    assert features[5] == pytest.approx(np.std(dwells))
+
+
+def test_remove_without_insert_does_not_count_dwell():
+    stats = DeviceStats()
+    stats.update("removed", 0.0, 0)
+    assert stats.dwell_count == 0
+
+
+def test_hour_histogram_is_normalized():
+    stats = DeviceStats()
+    stats.update("inserted", 0.0, 9)
+    stats.update("inserted", 10.0, 9)
+    stats.update("inserted", 20.0, 14)
+    hours = stats.features(20.0)[6:]
+    assert hours[9] == pytest.approx(2 / 3)
+    assert hours[14] == pytest.approx(1 / 3)
+    assert math.fsum(hours) == pytest.approx(1.0)
+
+
+def test_update_returns_features_from_before_the_event():
+    store = FeatureStore()
+    first = store.update("D:", "inserted", 0.0, 9)
+    assert first == [0.0] * len(FEATURE_NAMES)
+    second = store.update("D:", "removed", 60.0, 9)
+    # The insert is visible, but the removal (and its dwell) is not yet.
+    assert second[0] > 0
+    assert second[3] == 0
+
+
+def test_replay_uses_point_in_time_features():
+    df = pd.DataFrame({
+        "device": ["D:", "D:", "D:"],
+        "event_type": ["inserted", "removed", "inserted"],
+        "timestamp": ["2025-01-01 10:00:00", "2025-01-01 10:10:00", "not a time"],
+    })
+    rows = FeatureStore().replay(df)
+    assert rows.shape == (3, len(FEATURE_NAMES))
+    assert not rows[0].any()
+    assert rows[1][2] == pytest.approx(600.0)
+    assert rows[1][3] == 0
+    assert not rows[2].any()  # Unparseable timestamps are skipped.
+
+
+@pytest.mark.skipif(not hasattr(time, "tzset"), reason="needs time.tzset")
+def test_replay_uses_the_same_epoch_as_live_events(monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    try:
+        # Either side of the spring-forward DST change.
+        timestamps = ["2025-03-09 01:30:00", "2025-03-09 03:30:00", "2025-07-01 12:00:00"]
+        parsed = pd.to_datetime(pd.Series(timestamps), format=TIMESTAMP_FORMAT)
+        expected = [time.mktime(time.strptime(t, TIMESTAMP_FORMAT)) for t in timestamps]
+        assert local_epoch_seconds(parsed).tolist() == expected
+
+        store = FeatureStore()
+        store.replay(pd.DataFrame({"device": ["D:"], "event_type": ["inserted"],
+                                   "timestamp": [timestamps[-1]]}))
+        assert store.devices["D:"].last_seen == expected[-1]
+    finally:
+        monkeypatch.undo()
+        time.tzset()
@@ -0,0 +1,114 @@
+# test_threat_detection.py
+import json
+import pickle
+
+import pytest
+
+import threat_detection
+from feature_store import FEATURE_NAMES, FeatureStore
+
+PREVIOUS = {"batch_interval": 9, "insert_alert_interval": 3, "model_file": "previous.pkl"}
+
+
+@pytest.mark.parametrize("overrides", [
+    {},
+    {"batch_interval": 0.5},
+    {"insert_alert_interval": 1, "model_file": "other.pkl"},
+])
+def test_validate_service_config_accepts_valid_values(overrides):
+    threat_detection.validate_service_config(dict(threat_detection.DEFAULT_SERVICE_CONFIG, **overrides))
+
+
+@pytest.mark.parametrize("overrides", [
+    {"batch_interval": "5"},
+    {"batch_interval": 0},
+    {"batch_interval": -1},
+    {"batch_interval": True},
+    {"insert_alert_interval": 0},
+    {"insert_alert_interval": 2.5},
+    {"insert_alert_interval": True},
+    {"model_file": ""},
+    {"model_file": None},
+])
+def test_validate_service_config_rejects_invalid_values(overrides):
+    with pytest.raises(ValueError):
+        threat_detection.validate_service_config(dict(threat_detection.DEFAULT_SERVICE_CONFIG, **overrides))
+
+
+def test_load_service_config_defaults_when_file_is_missing(tmp_path):
+    config = threat_detection.load_service_config(str(tmp_path / "missing.json"))
+    assert config == threat_detection.DEFAULT_SERVICE_CONFIG
+
+
+def test_load_service_config_merges_overrides(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"batch_interval": 1.5}))
+    config = threat_detection.load_service_config(str(path), previous=PREVIOUS)
+    assert config == dict(threat_detection.DEFAULT_SERVICE_CONFIG, batch_interval=1.5)
+
+
+@pytest.mark.parametrize("content", [
+    "{not json",
+    "[1, 2]",
+    json.dumps({"batch_interval": "5"}),
+    json.dumps({"insert_alert_interval": 0}),
+])
+def test_load_service_config_keeps_previous_config_when_invalid(tmp_path, content):
+    path = tmp_path / "config.json"
+    path.write_text(content)
+    assert threat_detection.load_service_config(str(path), previous=PREVIOUS) == PREVIOUS
+    assert threat_detection.load_service_config(str(path)) == threat_detection.DEFAULT_SERVICE_CONFIG
+
+
+@pytest.fixture
+def buffered_log(tmp_path, monkeypatch):
+    """Buffer events for an event log under tmp_path, as run_service does."""
+    event_log = tmp_path / "events.csv"
+    monkeypatch.setattr(threat_detection, "EVENT_LOG", str(event_log))
+    monkeypatch.setattr(threat_detection, "feature_store", FeatureStore())
+    monkeypatch.setattr(threat_detection, "_pending_events", [])
+    monkeypatch.setattr(threat_detection, "_buffer_events", True)
+    return event_log
+
+
+def test_flush_event_log_writes_buffered_events_in_one_append(buffered_log):
+    threat_detection.log_usb_event("D:", "removed", "first")
+    threat_detection.log_usb_event("D:", "removed", "second")
+    assert not buffered_log.exists()
+
+    events, behavior, log_offset = threat_detection.flush_event_log()
+    assert events['extra_info'].tolist() == ["first", "second"]
+    assert behavior.shape == (2, len(FEATURE_NAMES))
+    assert not behavior[0].any()  # No history before the device's first event.
+    assert behavior[1][1] > 0  # The second event sees the first one.
+    assert log_offset == 0
+
+    size = buffered_log.stat().st_size
+    threat_detection.log_usb_event("E:", "removed")
+    events, _, log_offset = threat_detection.flush_event_log()
+    assert events['device'].tolist() == ["E:"]
+    assert log_offset == size
+    assert len(buffered_log.read_text().splitlines()) == 4  # Header and three events.
+
+
+def test_flush_event_log_with_nothing_pending(buffered_log):
+    events, behavior, _ = threat_detection.flush_event_log()
+    assert events.empty
+    assert len(behavior) == 0
+    assert not buffered_log.exists()
+
+
+def test_reload_model_uses_new_model(tmp_path):
+    path = tmp_path / "model.pkl"
+    path.write_bytes(pickle.dumps(("new vectorizer", "new model")))
+    assert threat_detection.reload_model(str(path), "old vectorizer", "old model") == \
+        ("new vectorizer", "new model")
+
+
+@pytest.mark.parametrize("content", [None, b"", pickle.dumps(("vectorizer", "model"))[:10]])
+def test_reload_model_keeps_previous_model_when_load_fails(tmp_path, content):
+    path = tmp_path / "model.pkl"
+    if content is not None:
+        path.write_bytes(content)
+    assert threat_detection.reload_model(str(path), "old vectorizer", "old model") == \
+        ("old vectorizer", "old model")
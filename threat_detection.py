@@ -1,20 +1,60 @@
 # threat_detection.py
 import os
+import sys
+import json
 import time
+import signal
+import argparse
 import threading
 import subprocess
+import numpy as np
 import pandas as pd
 import pickle
+from feature_store import FeatureStore, combine_features
+import alert_rollups
 
 # File paths and configuration
 EVENT_LOG = "event_data.csv"
 SECURITY_ALERT_LOG = "security_alerts.csv"
 MODEL_FILE = "threat_model.pkl"
 
+EVENT_COLUMNS = ["device", "event_type", "timestamp", "extra_info"]
+
 # For flagging every 2nd USB insertion event (flagging by our logging mechanism)
 INSERT_ALERT_INTERVAL = 2
 usb_insert_counts = {}
 
+# Service mode configuration (values in SERVICE_CONFIG override these defaults).
+SERVICE_CONFIG = "service_config.json"
+DEFAULT_SERVICE_CONFIG = {
+    "batch_interval": 5,
+    "insert_alert_interval": INSERT_ALERT_INTERVAL,
+    "model_file": MODEL_FILE,
+}
+
+# Set to stop the monitor thread; pending events (with their point-in-time feature
+# vectors) are buffered while the service runs.
+stop_event = threading.Event()
+_event_lock = threading.Lock()
+_pending_events = []
+_buffer_events = False
+
+# Per-device behavioral aggregates, updated on every logged event.
+feature_store = FeatureStore.load()
+
+# Employee logged in at this workstation; their role is attributed to new alerts.
+active_employee = None
+
+
+def set_active_employee(employee):
+    """Record the logged-in employee so alerts can be rolled up per role."""
+    global active_employee
+    active_employee = employee
+
+
+def _active_role():
+    return active_employee.get('role') if active_employee else None
+
 
 def flag_insert_event(device, count):
     threat_time = time.strftime("%Y-%m-%d %H:%M:%S")
@@ -24,10 +64,14 @@ def flag_insert_event(device, count):
         [[device, count, threat_time, flag_message]],
         columns=["device", "insert_count", "threat_time", "flag_message"]
     )
+    # Open (and, on first use, seed) the rollups before this alert reaches the log,
+    # so the seeding does not count it on top of record_alert below.
+    alert_rollups.get_connection()
     if os.path.exists(SECURITY_ALERT_LOG):
         alert_df.to_csv(SECURITY_ALERT_LOG, mode='a', header=False, index=False)
     else:
         alert_df.to_csv(SECURITY_ALERT_LOG, mode='w', index=False)
+    alert_rollups.record_alert(device, _active_role(), threat_time)
 
 
 def update_insert_count(device):
@@ -48,20 +92,56 @@ def log_usb_event(device, event_type, extra_info=""):
     Log a USB event (insertion or removal) with a timestamp and extra info.
     For an insertion event, update the insertion count.
     """
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    event_time = time.time()
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(event_time))
+    # Features describe the device as it was before this event, as in training.
+    behavior = feature_store.update(device, event_type, event_time)
     # Each row will have exactly 4 fields.
-    row = [[device, event_type, timestamp, extra_info]]
-    df = pd.DataFrame(row, columns=["device", "event_type", "timestamp", "extra_info"])
-    if os.path.exists(EVENT_LOG):
-        df.to_csv(EVENT_LOG, mode='a', header=False, index=False)
+    row = [device, event_type, timestamp, extra_info]
+    if _buffer_events:
+        # In service mode rows are written in batches by flush_event_log().
+        with _event_lock:
+            _pending_events.append((row, behavior))
     else:
-        df.to_csv(EVENT_LOG, mode='w', index=False)
+        _append_events(pd.DataFrame([row], columns=EVENT_COLUMNS))
     print(f"Logged USB {event_type} event for device [{device}] at {timestamp}. {extra_info}")
 
     if event_type == "inserted":
         update_insert_count(device)
 
 
+def _append_events(df):
+    if os.path.exists(EVENT_LOG):
+        df.to_csv(EVENT_LOG, mode='a', header=False, index=False)
+    else:
+        df.to_csv(EVENT_LOG, mode='w', index=False)
+
+
+def flush_event_log():
+    """
+    Write all buffered USB events to the event log in a single append.
+    Returns the flushed events as a DataFrame (empty if nothing was pending), the
+    array of feature vectors recorded for them when they were logged, and the size
+    of the event log before they were appended.
+    """
+    with _event_lock:
+        pending = list(_pending_events)
+        _pending_events.clear()
+    df = pd.DataFrame([row for row, _ in pending], columns=EVENT_COLUMNS)
+    behavior = np.array([features for _, features in pending], dtype=float)
+    log_offset = _file_size(EVENT_LOG)
+    if not df.empty:
+        _append_events(df)
+    return df, behavior, log_offset
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
 # ----------------------------
 # Platform-Specific USB Monitoring
 # ----------------------------
@@ -80,7 +160,11 @@ if os.name != 'nt':
         monitor.filter_by(subsystem='usb')
         print("Monitoring USB events on Linux using pyudev.")
         try:
-            for device in iter(monitor.poll, None):
+            while not stop_event.is_set():
+                # Poll with a timeout so the stop event is checked regularly.
+                device = monitor.poll(timeout=1)
+                if device is None:
+                    continue
                 if device.action == 'add':
                     event_type = "inserted"
                     extra_info = f"Device node: {getattr(device, 'device_node', 'N/A')}"
@@ -110,9 +194,13 @@ else:
         print("Monitoring USB events on Windows using WMI.")
         watcher = c.Win32_VolumeChangeEvent.watch_for()
         try:
-            while True:
+            while not stop_event.is_set():
+                try:
+                    # Wait with a timeout so the stop event is checked regularly.
+                    event = watcher(timeout_ms=1000)
+                except wmi.x_wmi_timed_out:
+                    continue
                 try:
-                    event = watcher()
                     if event.EventType == 2:
                         event_type = "inserted"
                     elif event.EventType == 3:
@@ -131,55 +219,78 @@ else:
 
 def start_monitoring(duration=10):
     """
-    Start USB event monitoring in a daemon thread for a specified duration (in seconds).
+    Start USB event monitoring in a daemon thread for a specified duration (in seconds),
+    then stop the thread.
     """
+    stop_event.clear()
     monitor_thread = threading.Thread(target=monitor_usb, daemon=True)
     monitor_thread.start()
     print(f"Monitoring USB events for {duration} seconds...")
-    time.sleep(duration)
+    stop_event.wait(duration)
+    stop_event.set()
+    monitor_thread.join(timeout=5)
+    feature_store.save()
     print("Finished monitoring USB events.")
 
 
 # ----------------------------
 # Machine Learning Integration
 # ----------------------------
-def load_model():
+def load_model(model_file=MODEL_FILE):
     """Load the trained threat detection model from disk."""
     try:
-        with open(MODEL_FILE, 'rb') as f:
+        with open(model_file, 'rb') as f:
             vectorizer, model = pickle.load(f)
         print("Threat detection model loaded successfully.")
         return vectorizer, model
     except FileNotFoundError:
         print("Error: Model file not found. Run train_model.py first.")
         return None, None
+    except (OSError, EOFError, ValueError, AttributeError, ImportError, pickle.UnpicklingError) as e:
+        print(f"Error loading model file {model_file}: {e}")
+        return None, None
 
 
-def analyze_threats():
+def analyze_threats(events=None, vectorizer=None, model=None, behavior=None, log_offset=None):
     """
     Use the machine learning model to analyze the logged USB events.
+    If `events` is given, only those events are scored (instead of the full event log),
+    using the point-in-time feature vectors in `behavior`; a preloaded `vectorizer` and
+    `model` are used when provided.
+    For the full event log, features are rebuilt by replaying the log as in training.
+    Threats in event log rows past the rollup watermark are added to the alert rollups.
+    For `events`, this needs `log_offset`, the event log size before they were appended.
     For every event predicted as a threat, add the following columns:
       - insert_count (set to 1 for this event)
       - threat_time (taken from the event's timestamp)
       - flag_message (a message indicating an ML-predicted threat)
     Returns a DataFrame containing only the threat events.
     """
-    vectorizer, model = load_model()
     if model is None:
-        return pd.DataFrame()
-    try:
-        # Use on_bad_lines='skip' to bypass rows with an unexpected number of fields.
-        df = pd.read_csv(EVENT_LOG, on_bad_lines='skip')
-    except FileNotFoundError:
-        print("Error: event_data.csv not found.")
-        return pd.DataFrame()
+        vectorizer, model = load_model()
+        if model is None:
+            return pd.DataFrame()
+    if events is not None:
+        df = events.copy()
+    else:
+        # Taken before reading, so rows appended meanwhile are beyond the watermark.
+        log_size = _file_size(EVENT_LOG)
+        try:
+            # Use on_bad_lines='skip' to bypass rows with an unexpected number of fields.
+            df = pd.read_csv(EVENT_LOG, on_bad_lines='skip')
+        except FileNotFoundError:
+            print("Error: event_data.csv not found.")
+            return pd.DataFrame()
 
     if 'device' not in df.columns:
         print("Error: 'device' column not found in the event log.")
         return pd.DataFrame()
 
-    # Transform the 'device' field and make predictions.
-    X = vectorizer.transform(df['device'].astype(str))
+    # Combine the 'device' bag-of-words with the device's behavioral features and predict.
+    devices = df['device'].astype(str)
+    if behavior is None:
+        behavior = FeatureStore().replay(df)
+    X = combine_features(vectorizer, model, devices, behavior)
     df['prediction'] = model.predict(X)
     df['predicted_threat'] = df['prediction'].apply(lambda x: "Threat" if x == 1 else "Safe")
 
@@ -190,9 +301,169 @@ def analyze_threats():
     df_threats['threat_time'] = df_threats['timestamp']
     df_threats['flag_message'] = "ML predicted threat based on USB insertion"
 
+    rolled_rows, rolled_offset = alert_rollups.get_event_watermark()
+    if events is None:
+        if rolled_rows > len(df) or rolled_offset > log_size:
+            rolled_rows = 0  # The event log was truncated or replaced.
+        # Roll up only rows not counted before, so rescoring the log never double counts.
+        _record_threats(df_threats[df_threats.index >= rolled_rows], (len(df), log_size))
+    elif log_offset is not None:
+        if rolled_offset == log_offset:
+            _record_threats(df_threats, (rolled_rows + len(df), _file_size(EVENT_LOG)))
+        else:
+            # The log holds rows the rollups have not seen yet; catch up from the full log.
+            analyze_threats(vectorizer=vectorizer, model=model)
+
     return df_threats
 
 
+def _record_threats(df_threats, watermark):
+    role = _active_role()
+    alert_rollups.record_alerts(
+        ((device, role, threat_time)
+         for device, threat_time in zip(df_threats['device'], df_threats['threat_time'])),
+        watermark)
+
+
+# ----------------------------
+# Service Mode
+# ----------------------------
+def add_service_arguments(parser):
+    """Add the service mode command-line options shared by main.py and this module."""
+    parser.add_argument("--service", action="store_true",
+                        help="Run continuously, analyzing new events in periodic micro-batches.")
+    parser.add_argument("--config", default=SERVICE_CONFIG,
+                        help="Service configuration file (reloaded on change or SIGHUP).")
+    return parser
+
+
+def validate_service_config(config):
+    """Raise ValueError if a service configuration value has the wrong type or range."""
+    batch_interval = config['batch_interval']
+    if isinstance(batch_interval, bool) or not isinstance(batch_interval, (int, float)) \
+            or batch_interval <= 0:
+        raise ValueError(f"batch_interval must be a positive number, got {batch_interval!r}")
+    interval = config['insert_alert_interval']
+    if isinstance(interval, bool) or not isinstance(interval, int) or interval < 1:
+        raise ValueError(f"insert_alert_interval must be a positive integer, got {interval!r}")
+    if not isinstance(config['model_file'], str) or not config['model_file']:
+        raise ValueError(f"model_file must be a non-empty path, got {config['model_file']!r}")
+
+
+def load_service_config(config_path=SERVICE_CONFIG, previous=None):
+    """
+    Load the service configuration from a JSON file, falling back to the defaults
+    for any missing keys (or when the file does not exist). If the file cannot be
+    read or holds invalid values, the `previous` configuration (or the defaults) is
+    kept so a bad edit never stops a running service.
+    """
+    fallback = previous or dict(DEFAULT_SERVICE_CONFIG)
+    config = dict(DEFAULT_SERVICE_CONFIG)
+    try:
+        with open(config_path) as f:
+            overrides = json.load(f)
+        if not isinstance(overrides, dict):
+            raise ValueError("expected a JSON object")
+        config.update(overrides)
+        validate_service_config(config)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        action = "Keeping the current configuration" if previous else "Using defaults"
+        print(f"Error reading service config {config_path}: {e}. {action}.")
+        return fallback
+    return config
+
+
+def _file_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def reload_model(model_file, vectorizer, model):
+    """
+    Load the model in `model_file`, falling back to the current `vectorizer` and
+    `model` if it cannot be read (e.g. it is missing or only partly written).
+    """
+    new_vectorizer, new_model = load_model(model_file)
+    if new_model is not None:
+        return new_vectorizer, new_model
+    if model is not None:
+        print("Keeping the previously loaded model.")
+    return vectorizer, model
+
+
+def _run_micro_batch(vectorizer, model):
+    """Flush newly arrived events and score only those events with the warm model."""
+    events, behavior, log_offset = flush_event_log()
+    if events.empty:
+        return
+    feature_store.save()
+    if model is None:
+        return
+    threats = analyze_threats(events, vectorizer, model, behavior, log_offset)
+    if not threats.empty:
+        print("Threat events detected in this batch:")
+        print(threats[['device', 'insert_count', 'threat_time', 'flag_message']])
+
+
+def run_service(config_path=SERVICE_CONFIG):
+    """
+    Run USB monitoring continuously with periodic micro-batch analysis of new events.
+    The model is loaded once and kept in memory. SIGINT/SIGTERM stop the monitor thread
+    and flush pending events; SIGHUP (or editing the config file) reloads the configuration.
+    """
+    global INSERT_ALERT_INTERVAL, _buffer_events
+
+    reload_requested = threading.Event()
+
+    def request_stop(signum, frame):
+        print("\nShutdown requested. Stopping USB monitoring...")
+        stop_event.set()
+
+    def request_reload(signum, frame):
+        reload_requested.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, request_reload)
+
+    config = load_service_config(config_path)
+    config_mtime = _file_mtime(config_path)
+    INSERT_ALERT_INTERVAL = config['insert_alert_interval']
+    vectorizer, model = load_model(config['model_file'])
+    model_mtime = _file_mtime(config['model_file'])
+
+    stop_event.clear()
+    _buffer_events = True
+    monitor_thread = threading.Thread(target=monitor_usb, daemon=True)
+    monitor_thread.start()
+    print(f"USB threat detection service running (batch interval: {config['batch_interval']}s).")
+
+    try:
+        while not stop_event.wait(config['batch_interval']):
+            if reload_requested.is_set() or _file_mtime(config_path) != config_mtime:
+                reload_requested.clear()
+                config = load_service_config(config_path, previous=config)
+                config_mtime = _file_mtime(config_path)
+                INSERT_ALERT_INTERVAL = config['insert_alert_interval']
+                print("Service configuration reloaded.")
+            if _file_mtime(config['model_file']) != model_mtime:
+                model_mtime = _file_mtime(config['model_file'])
+                vectorizer, model = reload_model(config['model_file'], vectorizer, model)
+            _run_micro_batch(vectorizer, model)
+    finally:
+        stop_event.set()
+        monitor_thread.join(timeout=5)
+        # Flush and analyze anything that arrived since the last batch.
+        _run_micro_batch(vectorizer, model)
+        _buffer_events = False
+        print("USB threat detection service stopped.")
+
+
 # ----------------------------
 # Retrieve User Activity Details
 # ----------------------------
@@ -213,6 +484,10 @@ def get_user_activity_details(employee):
 
 # Allow standalone testing.
 if __name__ == "__main__":
+    args = add_service_arguments(argparse.ArgumentParser(description="USB threat detection.")).parse_args()
+    if args.service:
+        run_service(args.config)
+        sys.exit(0)
     start_monitoring(duration=10)
     threats = analyze_threats()
     if not threats.empty:
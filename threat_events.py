@@ -1,6 +1,7 @@
 # threat_events.py
 import pandas as pd
 import os
+import alert_rollups
 
 SECURITY_ALERT_LOG = "security_alerts.csv"
 
@@ -17,5 +18,22 @@ def display_threat_events():
         print("No threat event file found. No threat events have been logged yet.")
 
 
+def display_alert_summary():
+    """Print dashboard-style aggregates from the alert rollups."""
+    top_devices = alert_rollups.top_devices_this_week()
+    if top_devices:
+        print("Top devices by alerts this week:")
+        print(pd.DataFrame(top_devices, columns=["device", "alerts"]).to_string(index=False))
+    else:
+        print("No alerts recorded this week.")
+
+    per_role = alert_rollups.alerts_per_hour_by_role()
+    if per_role:
+        print("\nAlerts per hour per role (last 24 hours):")
+        df = pd.DataFrame(per_role, columns=["hour", "role", "alerts"])
+        print(df.pivot(index="hour", columns="role", values="alerts").fillna(0).astype(int))
+
+
 if __name__ == "__main__":
     display_threat_events()
+    display_alert_summary()
@@ -1,40 +1,61 @@
 # train_model.py
+import os
 import pandas as pd
 import pickle
+from scipy.sparse import csr_matrix, hstack
 from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score
+from feature_store import FeatureStore
 
 EVENT_LOG = "event_data.csv"
 MODEL_FILE = "threat_model.pkl"
 
 
-def train_model():
-    """Train a machine learning model for USB threat detection using the event log."""
+def train_model(event_log=EVENT_LOG, model_file=MODEL_FILE, n_estimators=100, max_depth=None,
+                n_jobs=None, vocab_size=None, random_state=42):
+    """
+    Train a machine learning model for USB threat detection using the event log.
+    `vocab_size` caps the vectorizer vocabulary; the remaining arguments are passed
+    to the RandomForestClassifier. `random_state` seeds both the train/test split and
+    the forest so runs are reproducible. Returns the accuracy on the held-out test set.
+    """
     try:
-        df = pd.read_csv(EVENT_LOG)
+        df = pd.read_csv(event_log)
     except FileNotFoundError:
-        print("Error: event_data.csv not found. Ensure USB events are being logged before training the model.")
-        return
+        print(f"Error: {event_log} not found. Ensure USB events are being logged before training the model.")
+        return None
 
     # Label 'inserted' events as threat (1) and 'removed' events as safe (0)
     df['threat'] = df['event_type'].apply(lambda x: 1 if x == "inserted" else 0)
 
-    # Use the 'device' field as the feature.
-    vectorizer = CountVectorizer()
-    X = vectorizer.fit_transform(df['device'].astype(str))
+    # Use the 'device' field as the feature, together with the device's behavioral
+    # features (decayed rates, dwell time, hour of day) as of each event.
+    vectorizer = CountVectorizer(max_features=vocab_size)
+    X_words = vectorizer.fit_transform(df['device'].astype(str))
+    behavior = FeatureStore().replay(df)
+    X = hstack([X_words, csr_matrix(behavior)]).tocsr()
     y = df['threat']
 
     # Optionally split data (here we use 80% training and 20% testing)
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=random_state)
 
-    model = RandomForestClassifier(n_estimators=100)
+    model = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, n_jobs=n_jobs,
+                                   random_state=random_state)
     model.fit(X_train, y_train)
 
-    with open(MODEL_FILE, 'wb') as f:
+    accuracy = accuracy_score(y_test, model.predict(X_test))
+    print(f"Test-set accuracy: {accuracy:.4f}")
+
+    # Write atomically so a running service never loads a half-written model.
+    tmp_path = model_file + ".tmp"
+    with open(tmp_path, 'wb') as f:
         pickle.dump((vectorizer, model), f)
+    os.replace(tmp_path, model_file)
 
-    print("Threat detection model trained and saved successfully as", MODEL_FILE)
+    print("Threat detection model trained and saved successfully as", model_file)
+    return accuracy
 
 
 if __name__ == "__main__":